@@ -1,17 +1,60 @@
+import functools
 import json
+import math
 import os
+import re
+import shutil
+import string
+import subprocess
+import sys
+from concurrent.futures import ThreadPoolExecutor
 from moviepy import (
     VideoFileClip,
     AudioFileClip,
+    CompositeAudioClip,
     ImageClip,
+    ImageSequenceClip,
     TextClip,
     CompositeVideoClip,
     concatenate_videoclips,
     vfx,
     ColorClip
 )
+from moviepy.config import FFMPEG_BINARY
+from moviepy.video.io.ffmpeg_reader import ffmpeg_parse_infos
 from moviepy.video.io.VideoFileClip import VideoFileClip
 import numpy as np
+from PIL import ImageFont
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# File names per directory, scanned once so existence checks don't stat every candidate
+_dir_cache = {}
+
+def _listdir(directory):
+    """Return the file names in a directory and their lower-cased forms, scanning it only once"""
+    directory = os.path.normcase(os.path.abspath(directory))
+    if directory not in _dir_cache:
+        try:
+            with os.scandir(directory) as entries:
+                names = {entry.name for entry in entries}
+        except OSError:
+            names = set()
+        _dir_cache[directory] = (names, {name.lower() for name in names})
+    return _dir_cache[directory]
+
+def file_exists(path):
+    """Check whether a path exists using the cached directory listing"""
+    directory, name = os.path.split(path)
+    names, lower_names = _listdir(directory)
+    if name in names:
+        return True
+    # A name differing only in case exists on case-insensitive filesystems
+    # (Windows, macOS) but not elsewhere, so only then ask the filesystem
+    return name.lower() in lower_names and os.path.exists(path)
 
 def find_audio_file(base_path):
     """Try to find an audio file with different extensions"""
@@ -19,13 +62,13 @@ def find_audio_file(base_path):
     possible_extensions = ['.wav', '.mp3', '.ogg', '.m4a', '.aac']
     
     # Try the original extension first
-    if os.path.exists(base_path):
+    if file_exists(base_path):
         return base_path
     
     # Try other extensions
     for ext in possible_extensions:
         test_path = base + ext
-        if os.path.exists(test_path):
+        if file_exists(test_path):
             print(f"Found audio file: {test_path}")
             return test_path
     
@@ -38,7 +81,7 @@ def load_asset(path, asset_type="video"):
         if not path:
             print(f"Warning: No audio file found for '{path}' (tried .wav, .mp3, .ogg, .m4a, .aac)")
             return None
-    elif not os.path.exists(path):
+    elif not file_exists(path):
         print(f"Warning: {asset_type} file not found at '{path}'")
         return None
     
@@ -53,6 +96,14 @@ def load_asset(path, asset_type="video"):
         print(f"Error loading {asset_type} file '{path}': {str(e)}")
         return None
 
+# Source clips for the subclip caches, keyed by id() so the cached functions only hash ints
+_subclip_sources = {}
+
+@functools.lru_cache(maxsize=128)
+def _cached_subclip(clip_id, start_time, end_time):
+    """Subclip a registered source clip, reusing the result for repeated ranges"""
+    return _subclip_sources[clip_id].subclipped(start_time, end_time)
+
 def safe_subclip(clip, start_time, end_time):
     """Create a subclip with duration validation"""
     if end_time > clip.duration:
@@ -67,25 +118,24 @@ def safe_subclip(clip, start_time, end_time):
         print(f"Warning: start_time ({start_time:.2f}s) must be less than end_time ({end_time:.2f}s). Skipping this clip.")
         return None
     
-    return clip.subclipped(start_time, end_time)
+    _subclip_sources[id(clip)] = clip
+    return _cached_subclip(id(clip), start_time, end_time)
+
+@functools.lru_cache(maxsize=32)
+def _cached_loop(clip_id, duration):
+    """Loop a registered source clip, reusing the result for repeated durations"""
+    # Loop wraps time around the clip duration instead of concatenating copies
+    return _subclip_sources[clip_id].with_effects([vfx.Loop(duration=duration)])
 
 def loop_clip(clip, duration):
     """Create a looped version of a clip to match the specified duration"""
     if clip.duration >= duration:
         return clip.subclipped(0, duration)
     
-    # Calculate how many times we need to loop
-    loops = int(duration / clip.duration) + 1
-    
-    # Create a list of looped clips
-    looped_clips = [clip] * loops
-    
-    # Concatenate them
-    concatenated = concatenate_videoclips(looped_clips)
-    
-    # Trim to exact duration
-    return concatenated.subclipped(0, duration)
+    _subclip_sources[id(clip)] = clip
+    return _cached_loop(id(clip), duration)
 
+@functools.lru_cache(maxsize=256)
 def find_font_file(font_name):
     """Try to find a font file on the system"""
     # Common font locations on Windows
@@ -99,94 +149,494 @@ def find_font_file(font_name):
     ]
     
     for path in possible_paths:
-        if os.path.exists(path):
+        if file_exists(path):
             return path
     
     # If not found, try to use a default font
     default_fonts = ["arial.ttf", "times.ttf", "cour.ttf", "verdana.ttf"]
     for font in default_fonts:
         path = f"C:/Windows/Fonts/{font}"
-        if os.path.exists(path):
+        if file_exists(path):
             return path
     
     # If all else fails, return None and let TextClip use its default
     return None
 
+COLOR_MAP = {
+    'white': (255, 255, 255),
+    'black': (0, 0, 0),
+    'red': (255, 0, 0),
+    'green': (0, 255, 0),
+    'blue': (0, 0, 255),
+    'yellow': (255, 255, 0),
+    'cyan': (0, 255, 255),
+    'magenta': (255, 0, 255),
+    'orange': (255, 165, 0),
+    'purple': (128, 0, 128),
+    'pink': (255, 192, 203),
+    'brown': (165, 42, 42),
+    'gray': (128, 128, 128),
+    'grey': (128, 128, 128),
+    'gold': (255, 215, 0),
+    'silver': (192, 192, 192)
+}
+
+@functools.lru_cache(maxsize=256)
 def color_string_to_rgb(color_string):
     """Convert color string to RGB tuple"""
-    color_map = {
-        'white': (255, 255, 255),
-        'black': (0, 0, 0),
-        'red': (255, 0, 0),
-        'green': (0, 255, 0),
-        'blue': (0, 0, 255),
-        'yellow': (255, 255, 0),
-        'cyan': (0, 255, 255),
-        'magenta': (255, 0, 255),
-        'orange': (255, 165, 0),
-        'purple': (128, 0, 128),
-        'pink': (255, 192, 203),
-        'brown': (165, 42, 42),
-        'gray': (128, 128, 128),
-        'grey': (128, 128, 128),
-        'gold': (255, 215, 0),
-        'silver': (192, 192, 192)
-    }
-    
     # Convert to lowercase for case-insensitive matching
     color_lower = color_string.lower()
     
-    if color_lower in color_map:
-        return color_map[color_lower]
+    if color_lower in COLOR_MAP:
+        return COLOR_MAP[color_lower]
     else:
         # Try to parse as hex
         if color_string.startswith('#'):
             hex_color = color_string[1:]
-            if len(hex_color) == 6:
-                return tuple(int(hex_color[i:i+2], 16) for i in (0, 2, 4))
+            # int() alone would also accept signs, whitespace, underscores and a 0x prefix
+            if len(hex_color) in (3, 6) and all(c in string.hexdigits for c in hex_color):
+                value = int(hex_color, 16)
+                if len(hex_color) == 6:
+                    return ((value >> 16) & 0xFF, (value >> 8) & 0xFF, value & 0xFF)
+                # Short form: each digit is doubled, e.g. #f80 -> #ff8800
+                return (((value >> 8) & 0xF) * 0x11, ((value >> 4) & 0xF) * 0x11, (value & 0xF) * 0x11)
         
         # Default to white if color not recognized
         print(f"Warning: Color '{color_string}' not recognized, using white")
         return (255, 255, 255)
 
-# Load JSON
-with open("edit_config_advanced.json", "r") as f:
-    config = json.load(f)
+# Frame rate of the rendered video, shared by both renderers
+OUTPUT_FPS = 24
+
+# NVENC rate control: constant-quality VBR, roughly matching x264's default quality
+NVENC_PRESET = "p4"
+NVENC_PARAMS = ["-rc", "vbr", "-cq", "23", "-b:v", "0"]
+
+# x264 settings: a fast preset on all cores, with the moov atom up front for streaming
+X264_PRESET = "veryfast"
+X264_PARAMS = ["-movflags", "+faststart", "-tune", "fastdecode"]
+
+@functools.lru_cache(maxsize=64)
+def probe_media(path):
+    """Return (duration, has_audio, size) for a media file, or None if ffmpeg can't read it"""
+    try:
+        infos = ffmpeg_parse_infos(path)
+    except (OSError, KeyError):
+        return None
+    size = infos.get("video_size")
+    # ffmpeg (and MoviePy's reader) autorotate, so report the displayed size
+    if size and abs(infos.get("video_rotation", 0)) in (90, 270):
+        size = [size[1], size[0]]
+    return infos["duration"], infos["audio_found"], size
+
+@functools.lru_cache(maxsize=8)
+def nvenc_available(ffmpeg_binary):
+    """Check whether the given ffmpeg build exposes the h264_nvenc encoder"""
+    try:
+        result = subprocess.run([ffmpeg_binary, "-hide_banner", "-encoders"], capture_output=True, text=True)
+    except OSError:
+        return False
+    return "h264_nvenc" in result.stdout
+
+@functools.lru_cache(maxsize=8)
+def drawtext_available(ffmpeg_binary):
+    """Check whether the given ffmpeg build has the drawtext filter (it needs libfreetype)"""
+    try:
+        result = subprocess.run([ffmpeg_binary, "-hide_banner", "-filters"], capture_output=True, text=True)
+    except OSError:
+        return False
+    return re.search(r"\bdrawtext\b", result.stdout) is not None
+
+# Effect types the ffmpeg filter graph cannot express; any of these forces the MoviePy path
+MOVIEPY_ONLY_EFFECTS = {"outline", "shadow"}
+# drawtext has no stream of its own to blur, so text overlays also need MoviePy for glow
+TEXT_MOVIEPY_ONLY_EFFECTS = MOVIEPY_ONLY_EFFECTS | {"glow"}
+
+def _escape_filter_value(value):
+    """Escape a string for use as a filter option value inside -filter_complex"""
+    # First level: filter option parsing, second level: filtergraph parsing
+    value = re.sub(r"([\\:'])", r"\\\1", str(value))
+    return re.sub(r"([\\'\[\],;])", r"\\\1", value)
+
+# Keyword positions as (x, y); numbers are fractions of the frame size
+POSITION_KEYWORDS = {
+    "center": ("center", "center"),
+    "top-center": ("center", 0.1),
+    "bottom-center": ("center", 0.9),
+    "top-left": (0.1, 0.1),
+    "top-right": (0.9, 0.1),
+    "bottom-left": (0.1, 0.9),
+    "bottom-right": (0.9, 0.9),
+}
+
+def _ffmpeg_position(position, main_w, main_h, overlay_w, overlay_h):
+    """Convert position from ratio/keyword to ffmpeg x/y expressions"""
+    if isinstance(position, str):
+        position = POSITION_KEYWORDS.get(position, ("center", "center"))
+    elif not (isinstance(position, list) and len(position) == 2):
+        position = ("center", "center")
+
+    x, y = position
+    x_expr = f"({main_w}-{overlay_w})/2" if x == "center" else f"{main_w}*{x}"
+    y_expr = f"({main_h}-{overlay_h})/2" if y == "center" else f"{main_h}*{y}"
+    return x_expr, y_expr
+
+def _ffmpeg_animation(animation, x_expr, y_expr, start_time, main_w, overlay_w):
+    """Apply a bounce/scroll animation to ffmpeg x/y expressions. Returns None if unsupported."""
+    t = f"(t-{start_time})"
+    if animation["type"] == "bounce":
+        height = animation.get("height", 20)
+        y_expr = f"{y_expr}-trunc({height}*abs(sin({t}*PI/{animation['duration']})))"
+    elif animation["type"] == "scroll":
+        speed = f"{overlay_w}/{animation['duration']}"
+        if animation["direction"] == "left_to_right":
+            x_expr = f"-{overlay_w}+{t}*{speed}"
+        elif animation["direction"] == "right_to_left":
+            x_expr = f"{main_w}+{overlay_w}-{t}*{speed}"
+    elif animation["type"] == "typewriter":
+        return None
+    return x_expr, y_expr
+
+def _ffmpeg_fades(effects, start_time, duration, alpha=False):
+    """Convert fadein/fadeout effects to ffmpeg fade filters. Returns None if unsupported."""
+    filters = []
+    for effect in effects:
+        if effect["type"] in MOVIEPY_ONLY_EFFECTS:
+            return None
+        if effect["type"] == "fadein":
+            filters.append(f"fade=t=in:st={start_time}:d={effect['duration']}" + (":alpha=1" if alpha else ""))
+        elif effect["type"] == "fadeout":
+            fade_start = start_time + duration - effect["duration"]
+            filters.append(f"fade=t=out:st={fade_start}:d={effect['duration']}" + (":alpha=1" if alpha else ""))
+    return filters
+
+def _ffmpeg_text_alpha(effects, start_time, end_time, opacity):
+    """Build a drawtext alpha expression from fades and opacity. Returns None if unsupported."""
+    factors = []
+    for effect in effects:
+        if effect["type"] in TEXT_MOVIEPY_ONLY_EFFECTS:
+            return None
+        if effect["type"] == "fadein":
+            factors.append(f"clip((t-{start_time})/{effect['duration']},0,1)")
+        elif effect["type"] == "fadeout":
+            factors.append(f"clip(({end_time}-t)/{effect['duration']},0,1)")
+    if opacity is not None:
+        factors.append(str(opacity))
+    return "*".join(factors)
+
+def _glow_filter(src, dst, radius, rgb):
+    """Build a filter graph fragment glowing stream src into stream dst.
+
+    Mirrors the MoviePy glow: a blurred copy tinted 30% toward the glow color is
+    screen-blended onto the stream, and the alpha spreads to the blurred alpha.
+    """
+    tint = ":".join(f"{channel}='val*0.7+{value * 0.3}'" for channel, value in zip("rgb", rgb))
+    return (
+        f"[{src}]format=gbrap,split[{dst}_base][{dst}_blur];"
+        f"[{dst}_blur]gblur=sigma={radius},lutrgb={tint}[{dst}_glow];"
+        f"[{dst}_base][{dst}_glow]blend=c0_mode=screen:c1_mode=screen:c2_mode=screen:c3_mode=lighten[{dst}]"
+    )
+
+def _hex_color(rgb, opacity=None):
+    """Format an RGB tuple as an ffmpeg color string"""
+    color = "0x{:02x}{:02x}{:02x}".format(*rgb)
+    return f"{color}@{opacity}" if opacity is not None else color
+
+def build_filter_graph(config, base_dir, output_path, video_codec_args=("-c:v", "libx264")):
+    """Build a single ffmpeg command rendering the whole edit with -filter_complex.
+
+    Returns the command as an argument list, or None when the config uses something
+    only the MoviePy pipeline can render (or references a missing asset).
+    """
+    if shutil.which(FFMPEG_BINARY) is None:
+        return None
+
+    # Like the MoviePy path, the output takes the first edit's size (1920x1080 without edits)
+    width, height = 1920, 1080
+    asset_paths = {}
+    for kind in ("videos", "gifs", "images"):
+        for asset in config["assets"][kind]:
+            asset_paths[(kind, asset["name"])] = os.path.join(base_dir, asset["path"])
+    for asset in config["assets"]["audios"]:
+        asset_paths[("audios", asset["name"])] = find_audio_file(os.path.join(base_dir, asset["path"]))
+
+    inputs = []
+    filters = []
+
+    def add_input(kind, name, *options):
+        path = asset_paths.get((kind, name))
+        if not path or not file_exists(path):
+            return None
+        inputs.extend([*options, "-i", path])
+        return inputs.count("-i") - 1
+
+    def add_stream(src, chain, effects, tail, label, pix_fmt):
+        """Add src filtered by chain, any glows, then tail as the stream [label]"""
+        glows = [effect for effect in effects if effect["type"] == "glow"]
+        if not glows:
+            filters.append(src + ",".join(chain + tail) + f"[{label}]")
+            return
+        filters.append(src + ",".join(chain) + f"[{label}g0]")
+        for g, effect in enumerate(glows):
+            glow_color = color_string_to_rgb(effect["color"])
+            filters.append(_glow_filter(f"{label}g{g}", f"{label}g{g + 1}", effect.get("radius", 5), glow_color))
+        # The glow works in planar RGB, so restore the pixel format before the tail
+        filters.append(f"[{label}g{len(glows)}]" + ",".join([f"format={pix_fmt}"] + tail) + f"[{label}]")
+
+    # Without config audio the MoviePy path keeps the sources' own sound, so do the same
+    keep_source_audio = not config["audio"]
+
+    # Main editing: trim, fit to the output size and concatenate
+    edit_labels = []
+    edit_audio = []
+    total_duration = 0
+    for n, edit in enumerate(config["editing"]):
+        if "asset" not in edit:
+            return None
+        path = asset_paths.get(("videos", edit["asset"]))
+        probe = probe_media(path) if path and file_exists(path) else None
+        if probe is None:
+            return None
+        source_duration = probe[0]
+        # Clamp to the source and skip empty ranges, the same way the MoviePy path does
+        start_time = min(edit["start_time"], source_duration - 0.1)
+        end_time = min(edit["end_time"], source_duration)
+        if start_time >= end_time:
+            continue
+        if not edit_labels:
+            if not probe[2]:
+                return None
+            width, height = probe[2]
+        index = add_input("videos", edit["asset"])
+        duration = end_time - start_time
+        chain = [
+            f"trim=start={start_time}:end={end_time}",
+            "setpts=PTS-STARTPTS",
+            f"scale={width}:{height}:force_original_aspect_ratio=decrease",
+            f"pad={width}:{height}:(ow-iw)/2:(oh-ih)/2",
+            "setsar=1",
+            f"fps={OUTPUT_FPS}",
+            "format=yuv420p",
+        ]
+        fades = _ffmpeg_fades(edit.get("effects", []), 0, duration)
+        if fades is None:
+            return None
+        add_stream(f"[{index}:v]", chain, edit.get("effects", []), fades, f"v{n}", "yuv420p")
+        edit_labels.append(f"[v{n}]")
+        edit_audio.append((index, start_time, end_time, probe[1]))
+        total_duration += duration
+
+    if keep_source_audio and any(has_audio for *_, has_audio in edit_audio):
+        # Silent sources get a silent segment so concat keeps audio and video aligned
+        segments = []
+        for n, (index, start_time, end_time, has_audio) in enumerate(edit_audio):
+            if has_audio:
+                filters.append(f"[{index}:a]atrim=start={start_time}:end={end_time},asetpts=PTS-STARTPTS[va{n}]")
+            else:
+                filters.append(f"anullsrc=r=44100:cl=stereo,atrim=duration={end_time - start_time}[va{n}]")
+            segments.append(f"{edit_labels[n]}[va{n}]")
+        filters.append("".join(segments) + f"concat=n={len(segments)}:v=1:a=1[base][base_audio]")
+        source_audio = "[base_audio]"
+    elif edit_labels:
+        source_audio = None
+        filters.append("".join(edit_labels) + f"concat=n={len(edit_labels)}:v=1:a=0[base]")
+    else:
+        source_audio = None
+        total_duration = 30
+        filters.append(f"color=c=black:s={width}x{height}:d=30:r={OUTPUT_FPS}[base]")
+
+    # Overlays: chained in config order on top of the base stream
+    current = "[base]"
+    for n, overlay in enumerate(config["overlays"]):
+        start_time = overlay["start_time"]
+        end_time = overlay["end_time"]
+        duration = end_time - start_time
+        opacity = overlay.get("opacity")
+        # MoviePy's composite runs on until the last overlay ends; -t below would cut it off
+        if end_time > total_duration:
+            return None
+
+        if overlay["type"] == "text":
+            if "size" in overlay or not drawtext_available(FFMPEG_BINARY):
+                return None
+            x_expr, y_expr = _ffmpeg_position(overlay["position"], "W", "H", "tw", "th")
+            if "animation" in overlay:
+                animated = _ffmpeg_animation(overlay["animation"], x_expr, y_expr, start_time, "W", "tw")
+                if animated is None:
+                    return None
+                x_expr, y_expr = animated
+            options = [f"text={_escape_filter_value(overlay['text'])}", "expansion=none"]
+            font_path = find_font_file(overlay.get("font", "Arial.ttf"))
+            if font_path:
+                options.append(f"fontfile={_escape_filter_value(font_path)}")
+            options += [
+                f"fontsize={overlay['font_size']}",
+                f"fontcolor={_hex_color(color_string_to_rgb(overlay['color']))}",
+                f"x='{x_expr}'",
+                f"y='{y_expr}'",
+            ]
+            alpha = _ffmpeg_text_alpha(overlay.get("effects", []), start_time, end_time, opacity)
+            if alpha is None:
+                return None
+            if alpha:
+                options.append(f"alpha='{alpha}'")
+            if "background" in overlay:
+                bg_color = color_string_to_rgb(overlay["background"]["color"])
+                options += ["box=1", f"boxcolor={_hex_color(bg_color, overlay['background']['opacity'])}"]
+            options.append(f"enable='between(t,{start_time},{end_time})'")
+            filters.append(f"{current}drawtext=" + ":".join(options) + f"[o{n}]")
+            current = f"[o{n}]"
+            continue
+
+        if "asset" not in overlay:
+            return None
+        if overlay["type"] == "video":
+            if keep_source_audio:
+                # MoviePy would also mix the overlay's own sound in; leave that to it
+                path = asset_paths.get(("videos", overlay["asset"]))
+                probe = probe_media(path) if path and file_exists(path) else None
+                if probe is None or probe[1]:
+                    return None
+            index = add_input("videos", overlay["asset"])
+            chain = [f"trim=start={start_time}:end={end_time}"]
+        elif overlay["type"] == "gif":
+            index = add_input("gifs", overlay["asset"], "-stream_loop", "-1")
+            chain = [f"trim=duration={duration}"]
+        elif overlay["type"] == "image":
+            index = add_input("images", overlay["asset"], "-loop", "1", "-framerate", str(OUTPUT_FPS))
+            chain = [f"trim=duration={duration}"]
+        else:
+            return None
+        if index is None:
+            return None
+
+        chain.append(f"setpts=PTS-STARTPTS+{start_time}/TB")
+        if "size" in overlay:
+            chain.append(f"scale={round(overlay['size'][0] * width)}:{round(overlay['size'][1] * height)}")
+        chain.append("format=rgba")
+        if opacity is not None:
+            chain.append(f"colorchannelmixer=aa={opacity}")
+        fades = _ffmpeg_fades(overlay.get("effects", []), start_time, duration, alpha=True)
+        if fades is None:
+            return None
+        add_stream(f"[{index}:v]", chain, overlay.get("effects", []), fades, f"s{n}", "rgba")
+
+        x_expr, y_expr = _ffmpeg_position(overlay["position"], "W", "H", "w", "h")
+        if "animation" in overlay:
+            animated = _ffmpeg_animation(overlay["animation"], x_expr, y_expr, start_time, "W", "w")
+            if animated is None:
+                return None
+            x_expr, y_expr = animated
+        filters.append(
+            f"{current}[s{n}]overlay=x='{x_expr}':y='{y_expr}':eof_action=pass"
+            f":enable='between(t,{start_time},{end_time})'[o{n}]"
+        )
+        current = f"[o{n}]"
+
+    # Audio: trim, adjust volume and mix all tracks in one node
+    audio_labels = []
+    for n, audio in enumerate(config["audio"]):
+        if "asset" not in audio:
+            return None
+        index = add_input("audios", audio["asset"])
+        if index is None:
+            return None
+        trim = f"atrim=start={audio['start_time']}"
+        if "end_time" in audio:
+            trim += f":end={audio['end_time']}"
+        filters.append(f"[{index}:a]{trim},asetpts=PTS-STARTPTS,volume={audio.get('volume', 1.0)}[a{n}]")
+        audio_labels.append(f"[a{n}]")
+
+    maps = ["-map", current]
+    if len(audio_labels) == 1:
+        maps += ["-map", audio_labels[0]]
+    elif audio_labels:
+        filters.append("".join(audio_labels) + f"amix=inputs={len(audio_labels)}:duration=longest:normalize=0[aout]")
+        maps += ["-map", "[aout]"]
+    elif source_audio:
+        maps += ["-map", source_audio]
+
+    return [
+        FFMPEG_BINARY, "-y", "-hide_banner",
+        *inputs,
+        "-filter_complex", ";".join(filters),
+        *maps,
+        "-t", str(total_duration),
+        "-r", str(OUTPUT_FPS),
+        *video_codec_args, "-pix_fmt", "yuv420p",
+        "-c:a", "aac",
+        output_path,
+    ]
+
+# Load JSON (orjson parses faster when it's installed)
+if orjson:
+    with open("edit_config_advanced.json", "rb") as f:
+        config = orjson.loads(f.read())
+else:
+    with open("edit_config_advanced.json", "r") as f:
+        config = json.load(f)
 
 # Get the directory where the script is located
 script_dir = os.path.dirname(os.path.abspath(__file__))
+output_path = os.path.join(script_dir, "output_overlays.mp4")
+
+# Render everything in a single ffmpeg pass when the config allows it
+ffmpeg_encoders = [("-c:v", "libx264", "-preset", X264_PRESET, "-threads", "0", *X264_PARAMS)]
+if nvenc_available(FFMPEG_BINARY):
+    ffmpeg_encoders.insert(0, ("-c:v", "h264_nvenc", "-preset", NVENC_PRESET, *NVENC_PARAMS))
+for video_codec_args in ffmpeg_encoders:
+    ffmpeg_cmd = build_filter_graph(config, script_dir, output_path, video_codec_args)
+    if not ffmpeg_cmd:
+        break
+    print(f"Rendering video with ffmpeg filter graph ({video_codec_args[1]}) to: {output_path}")
+    result = subprocess.run(ffmpeg_cmd)
+    if result.returncode == 0:
+        print("Done!")
+        sys.exit(0)
+    print(f"Warning: ffmpeg render with {video_codec_args[1]} failed")
+if ffmpeg_cmd:
+    print("Warning: ffmpeg render failed, falling back to MoviePy")
 
 # Load assets with error handling
+# Every asset load spawns ffmpeg/ffprobe subprocesses, so run them all concurrently
+with ThreadPoolExecutor(max_workers=8) as executor:
+    def submit_loads(entries, asset_type):
+        return [
+            (entry["name"], executor.submit(load_asset, os.path.join(script_dir, entry["path"]), asset_type))
+            for entry in entries
+        ]
+    
+    video_futures = submit_loads(config["assets"]["videos"], "video")
+    gif_futures = submit_loads(config["assets"]["gifs"], "gif")
+    image_futures = submit_loads(config["assets"]["images"], "image")
+    audio_futures = submit_loads(config["assets"]["audios"], "audio")
+
 video_assets = {}
-for v in config["assets"]["videos"]:
-    path = os.path.join(script_dir, v["path"])
-    clip = load_asset(path, "video")
+for name, future in video_futures:
+    clip = future.result()
     if clip:
-        video_assets[v["name"]] = clip
-        print(f"Loaded video '{v['name']}': duration {clip.duration:.2f}s")
+        video_assets[name] = clip
+        print(f"Loaded video '{name}': duration {clip.duration:.2f}s")
 
 gif_assets = {}
-for g in config["assets"]["gifs"]:
-    path = os.path.join(script_dir, g["path"])
-    clip = load_asset(path, "gif")
+for name, future in gif_futures:
+    clip = future.result()
     if clip:
-        gif_assets[g["name"]] = clip
-        print(f"Loaded GIF '{g['name']}': duration {clip.duration:.2f}s")
+        gif_assets[name] = clip
+        print(f"Loaded GIF '{name}': duration {clip.duration:.2f}s")
 
 image_assets = {}
-for i in config["assets"]["images"]:
-    path = os.path.join(script_dir, i["path"])
-    clip = load_asset(path, "image")
+for name, future in image_futures:
+    clip = future.result()
     if clip:
-        image_assets[i["name"]] = clip
+        image_assets[name] = clip
 
 audio_assets = {}
-for a in config["assets"]["audios"]:
-    path = os.path.join(script_dir, a["path"])
-    clip = load_asset(path, "audio")
+for name, future in audio_futures:
+    clip = future.result()
     if clip:
-        audio_assets[a["name"]] = clip
-        print(f"Loaded audio '{a['name']}': duration {clip.duration:.2f}s")
+        audio_assets[name] = clip
+        print(f"Loaded audio '{name}': duration {clip.duration:.2f}s")
 
 print(f"\nLoaded assets summary:")
 print(f"- Videos: {len(video_assets)}")
@@ -195,186 +645,217 @@ print(f"- Images: {len(image_assets)}")
 print(f"- Audio: {len(audio_assets)}")
 
 # Helper functions
+@functools.lru_cache(maxsize=256)
+def _parse_position(position, video_size):
+    """Cached worker for parse_position; takes hashable arguments only"""
+    if isinstance(position, str):
+        position = POSITION_KEYWORDS.get(position, ("center", "center"))
+    elif not (isinstance(position, tuple) and len(position) == 2):
+        return ("center", "center")
+    # Keyword and list numbers are both fractions of the frame size
+    return tuple(value if value == "center" else value * size for value, size in zip(position, video_size))
+
 def parse_position(position, video_size):
     """Convert position from ratio/keyword to absolute coordinates."""
-    if isinstance(position, str):
-        if position == "center":
-            return ("center", "center")
-        elif position == "top-center":
-            return ("center", 0.1)
-        elif position == "bottom-center":
-            return ("center", 0.9)
-        elif position == "top-left":
-            return (0.1, 0.1)
-        elif position == "top-right":
-            return (0.9, 0.1)
-        elif position == "bottom-left":
-            return (0.1, 0.9)
-        elif position == "bottom-right":
-            return (0.9, 0.9)
-    elif isinstance(position, list) and len(position) == 2:
-        return (position[0] * video_size[0], position[1] * video_size[1])
-    return ("center", "center")
-
-def apply_effects(clip, effects):
-    """Apply effects to a clip."""
+    if isinstance(position, list):
+        position = tuple(position)
+    elif not isinstance(position, str):
+        return ("center", "center")
+    return _parse_position(position, tuple(video_size))
+
+@functools.lru_cache(maxsize=64)
+def render_text(text, font, font_size, color):
+    """Rasterize a text clip once per (text, font, size, color) combination"""
+    return TextClip(text=text, font=font, font_size=font_size, color=color)
+
+@functools.lru_cache(maxsize=32)
+def make_background(size, color, opacity):
+    """Build a background box once per (size, color, opacity) combination"""
+    return ColorClip(size, color=color).with_opacity(opacity)
+
+def _fadein(clip, effect, scale, text_style):
+    """Fade a clip in from black"""
+    return clip.with_effects([vfx.FadeIn(effect["duration"])])
+
+def _fadeout(clip, effect, scale, text_style):
+    """Fade a clip out to black"""
+    return clip.with_effects([vfx.FadeOut(effect["duration"])])
+
+def _glow(clip, effect, scale, text_style):
+    """Add a colored glow around a clip"""
+    # A tinted layer behind the clip; no blurred copy, which would be re-blurred on every frame
+    glow_color = color_string_to_rgb(effect["color"])
+    color_layer = ColorClip(clip.size, color=glow_color, duration=clip.duration).with_opacity(0.3)
+    glowing = CompositeVideoClip([color_layer, clip])
+    glowing.text_left = getattr(clip, "text_left", 0)
+    return glowing
+
+def render_scaled_text(clip, text_style, scale, color):
+    """Render text_style at the clip's scaled font size, matched exactly to the clip's size"""
+    text, font, font_size = text_style
+    rendered = render_text(text, font, round(font_size * scale[1]), color)
+    if tuple(rendered.size) != tuple(clip.size):
+        # Non-uniform overlay sizes stretch the text, which a font size alone can't match
+        rendered = rendered.resized(clip.size)
+    return rendered.with_duration(clip.duration)
+
+def _outline(clip, effect, scale, text_style):
+    """Outline a text clip with offset copies of its text"""
+    # Simple outline effect using multiple copies of the text
+    if text_style is None:  # Only text clips can be outlined
+        return clip
+    outline_color = color_string_to_rgb(effect["color"])
+    outline_width = effect.get("width", 2)
+    width_x = round(outline_width * scale[0])
+    width_y = round(outline_width * scale[1])
+    
+    # Create outline by offsetting one rendered copy of the text in 4 directions
+    base = render_scaled_text(clip, text_style, scale, outline_color)
+    outlines = [
+        base.with_position((width_x + dx, width_y + dy))
+        for dx, dy in [(-width_x, 0), (width_x, 0), (0, -width_y), (0, width_y)]
+    ]
+    
+    # Composite outlines and original text, padded so no outline is cropped
+    outlined = CompositeVideoClip(
+        outlines + [clip.with_position((width_x, width_y))],
+        size=(clip.w + 2 * width_x, clip.h + 2 * width_y)
+    )
+    # Where the text now starts, for the typewriter reveal
+    outlined.text_left = getattr(clip, "text_left", 0) + width_x
+    return outlined
+
+def _shadow(clip, effect, scale, text_style):
+    """Drop a shadow behind a text clip"""
+    # Simple shadow effect
+    if text_style is None:  # Only text clips get a shadow
+        return clip
+    shadow_color = color_string_to_rgb(effect.get("color", "black"))
+    shadow_offset = effect.get("offset", [5, 5])
+    dx = round(shadow_offset[0] * scale[0])
+    dy = round(shadow_offset[1] * scale[1])
+    shadow_opacity = effect.get("opacity", 0.5)
+    
+    # Create shadow
+    shadow = render_scaled_text(clip, text_style, scale, shadow_color)
+    shadow = shadow.with_position((max(dx, 0), max(dy, 0))).with_opacity(shadow_opacity)
+    
+    # Composite shadow and original text, padded to fit the offset
+    shadowed = CompositeVideoClip(
+        [shadow, clip.with_position((max(-dx, 0), max(-dy, 0)))],
+        size=(clip.w + abs(dx), clip.h + abs(dy))
+    )
+    shadowed.text_left = getattr(clip, "text_left", 0) + max(-dx, 0)
+    return shadowed
+
+EFFECT_HANDLERS = {
+    "fadein": _fadein,
+    "fadeout": _fadeout,
+    "glow": _glow,
+    "outline": _outline,
+    "shadow": _shadow,
+}
+
+# Unknown effect types already reported, so each is only warned about once
+_unknown_effects = set()
+
+def apply_effects(clip, effects, scale=(1.0, 1.0), text_style=None):
+    """Apply effects to a clip.
+
+    scale is the (x, y) factor the clip was resized by from its rendered size, so
+    effects that re-render text match the clip's final resolution. text_style is the
+    (text, font, font_size) a text clip was rendered with, or None for other clips.
+    """
     for effect in effects:
-        if effect["type"] == "fadein":
-            clip = clip.with_effects([vfx.FadeIn(effect["duration"])])
-        elif effect["type"] == "fadeout":
-            clip = clip.with_effects([vfx.FadeOut(effect["duration"])])
-        elif effect["type"] == "glow":
-            # Create a simple glow effect using blur and color overlay
-            glow_color = color_string_to_rgb(effect["color"])
-            radius = effect.get("radius", 5)
-            
-            # Create a blurred version of the clip
-            try:
-                # Use blur effect if available
-                blurred_clip = clip.with_effects([vfx.GaussianBlur(radius)])
-            except:
-                # Fallback: just use the original clip
-                blurred_clip = clip
-            
-            # Create a colored overlay
-            color_layer = ColorClip(clip.size, color=glow_color, duration=clip.duration)
-            color_layer = color_layer.with_opacity(0.3)  # Adjust opacity for glow intensity
-            
-            # Composite the original clip, blurred version, and color overlay
-            glow_clip = CompositeVideoClip([blurred_clip, color_layer, clip])
-            clip = glow_clip
-            
-        elif effect["type"] == "outline":
-            # Simple outline effect using multiple copies of the text
-            if hasattr(clip, 'txt'):  # Check if it's a text clip
-                outline_color = color_string_to_rgb(effect["color"])
-                outline_width = effect.get("width", 2)
-                
-                # Create outline by offsetting the text in 4 directions
-                outlines = []
-                for dx, dy in [(-outline_width, 0), (outline_width, 0), (0, -outline_width), (0, outline_width)]:
-                    outline = TextClip(
-                        text=clip.txt,
-                        font=clip.font,
-                        font_size=clip.fontsize,
-                        color=outline_color
-                    ).with_duration(clip.duration).with_position((dx, dy))
-                    outlines.append(outline)
-                
-                # Composite outlines and original text
-                clip = CompositeVideoClip(outlines + [clip])
-                
-        elif effect["type"] == "shadow":
-            # Simple shadow effect
-            if hasattr(clip, 'txt'):  # Check if it's a text clip
-                shadow_color = color_string_to_rgb(effect.get("color", "black"))
-                shadow_offset = effect.get("offset", [5, 5])
-                shadow_opacity = effect.get("opacity", 0.5)
-                
-                # Create shadow
-                shadow = TextClip(
-                    text=clip.txt,
-                    font=clip.font,
-                    font_size=clip.fontsize,
-                    color=shadow_color
-                ).with_duration(clip.duration)
-                
-                # Position shadow with offset
-                shadow = shadow.with_position((
-                    clip.pos[0] + shadow_offset[0] if isinstance(clip.pos[0], (int, float)) else clip.pos[0],
-                    clip.pos[1] + shadow_offset[1] if isinstance(clip.pos[1], (int, float)) else clip.pos[1]
-                ))
-                
-                shadow = shadow.with_opacity(shadow_opacity)
-                
-                # Composite shadow and original text
-                clip = CompositeVideoClip([shadow, clip])
+        try:
+            handler = EFFECT_HANDLERS[effect["type"]]
+        except KeyError:
+            if effect["type"] not in _unknown_effects:
+                _unknown_effects.add(effect["type"])
+                print(f"Warning: Unknown effect type '{effect['type']}', skipping")
+            continue
+        clip = handler(clip, effect, scale, text_style)
     
     return clip
 
-def create_typewriter_effect(clip, duration):
-    """Create a typewriter effect using multiple text clips"""
-    if not hasattr(clip, 'txt'):
+def _reveal(mask_frame, cutoff):
+    """Hide every mask column right of the cutoff"""
+    frame = mask_frame.copy()
+    frame[:, cutoff:] = 0
+    return frame
+
+def create_typewriter_effect(clip, duration, text_style=None, scale=(1.0, 1.0)):
+    """Create a typewriter effect by progressively revealing a single text clip"""
+    if text_style is None:
         # If not a text clip, just return with fade effect
         return clip.with_effects([vfx.FadeIn(duration)])
     
-    text = clip.txt
+    text, font_path, font_size = text_style
     if not text:
         return clip
     
-    # Split text into characters for character-by-character reveal
-    characters = list(text)
-    char_duration = duration / len(characters)
-    
-    # Create individual clips for each character
-    char_clips = []
+    char_duration = duration / len(text)
     
-    for i, char in enumerate(characters):
-        # Create a text clip for just this character
-        char_clip = TextClip(
-            text=char,
-            font=clip.font,
-            font_size=clip.fontsize,
-            color=clip.color
-        ).with_duration(char_duration)
-        
-        # Position this character relative to the start
-        # This is a simplified version - in practice, you'd need to calculate proper positioning
-        char_clip = char_clip.with_position(clip.pos)
-        
-        # Set the start time for this character
-        char_clip = char_clip.with_start(i * char_duration)
-        
-        char_clips.append(char_clip)
+    # Measure where each character ends with the font the text clip was rendered with,
+    # so the text is only rasterized once
+    font = ImageFont.truetype(font_path, font_size) if font_path else ImageFont.load_default(font_size)
+    # Outline and shadow pad the text on the left, so measure from where it now starts
+    text_left = getattr(clip, "text_left", 0)
+    xs = [text_left + math.ceil(font.getlength(text[:i + 1]) * scale[0]) for i in range(len(text))]
+    xs[-1] = clip.w  # Fully reveal the clip once the last character is typed
     
-    # Composite all character clips
-    if char_clips:
-        return CompositeVideoClip(char_clips)
-    else:
-        return clip
+    # Reveal the text by masking out everything past the current character
+    mask = clip.mask if clip.mask is not None else clip.to_mask()
+    mask = mask.transform(
+        lambda get_frame, t: _reveal(get_frame(t), xs[min(int(t / char_duration), len(xs) - 1)])
+    )
+    return clip.with_mask(mask)
 
-def apply_animation(clip, animation, video_size):
-    """Apply animation to a clip."""
+def apply_animation(clip, animation, video_size, position, text_style=None, scale=(1.0, 1.0)):
+    """Apply animation to a clip placed at position (as returned by parse_position)."""
     if animation["type"] == "bounce":
-        # FIXED: Parse the position and store it as a tuple before applying animation
-        position = parse_position(clip.pos, video_size)
+        # Hoist everything constant out of the per-frame position function
+        x_pos = position[0]
+        if isinstance(position[1], (int, float)):
+            y_pos = position[1]
+        else:
+            y_pos = (video_size[1] - clip.h) / 2  # Default to center if not a number
+        bounce_height = animation.get("height", 20)
+        
+        # Positions are only sampled once per frame, so tabulate the integer offsets up front
+        frame_count = math.ceil(clip.duration * OUTPUT_FPS) + 2
+        frame_times = np.arange(frame_count) / OUTPUT_FPS
+        offsets = (bounce_height * np.abs(np.sin(frame_times * math.pi / animation["duration"]))).astype(np.int32)
         
         def bounce_pos(t):
-            # Get the original y position
-            if isinstance(position[1], (int, float)):
-                y_pos = position[1]
-            else:
-                y_pos = video_size[1] * 0.5  # Default to center if not a number
-            
-            # Calculate bounce offset
-            bounce_height = animation.get("height", 20)
-            offset = int(bounce_height * np.abs(np.sin(t * np.pi / animation["duration"])))
-            
-            # Return the new position
-            return (position[0], y_pos - offset)
+            return (x_pos, y_pos - int(offsets[min(int(t * OUTPUT_FPS), frame_count - 1)]))
         
         clip = clip.with_position(bounce_pos)
         
     elif animation["type"] == "scroll":
-        # FIXED: Parse the position and store it as a tuple before applying animation
-        position = parse_position(clip.pos, video_size)
-        
         # Get the original y position
         if isinstance(position[1], (int, float)):
             original_y = position[1]
         else:
-            original_y = video_size[1] * 0.5  # Default to center if not a number
-            
+            original_y = (video_size[1] - clip.h) / 2  # Default to center if not a number
+        
+        # Tabulate the integer x position for every frame, as for bounce
+        frame_count = math.ceil(clip.duration * OUTPUT_FPS) + 2
+        frame_times = np.arange(frame_count) / OUTPUT_FPS
+        speed = clip.w / animation["duration"]
+        xs = None
         if animation["direction"] == "left_to_right":
-            clip = clip.with_position(lambda t: (-clip.w + t * clip.w / animation["duration"], original_y))
+            xs = (-clip.w + frame_times * speed).astype(np.int32)
         elif animation["direction"] == "right_to_left":
-            clip = clip.with_position(lambda t: (video_size[0] + clip.w - t * clip.w / animation["duration"], original_y))
+            xs = (video_size[0] + clip.w - frame_times * speed).astype(np.int32)
+        if xs is not None:
+            clip = clip.with_position(lambda t: (int(xs[min(int(t * OUTPUT_FPS), frame_count - 1)]), original_y))
             
     elif animation["type"] == "typewriter":
         # Use a simpler approach that doesn't require BitmapClip
         try:
             # Try the character-by-character approach
-            clip = create_typewriter_effect(clip, animation["duration"])
+            clip = create_typewriter_effect(clip, animation["duration"], text_style, scale)
         except Exception as e:
             print(f"Character-by-character typewriter failed: {str(e)}")
             # Fallback to simple fade-in effect
@@ -382,22 +863,67 @@ def apply_animation(clip, animation, video_size):
     
     return clip
 
-# Calculate total video duration to fix timing issues
-total_duration = 0
-for edit in config["editing"]:
-    asset_name = edit["asset"]
-    if asset_name in video_assets:
-        original_duration = video_assets[asset_name].duration
-        requested_duration = edit["end_time"] - edit["start_time"]
-        actual_duration = min(requested_duration, original_duration - edit["start_time"])
-        if actual_duration > 0:
-            total_duration += actual_duration
+# Upper bound on the RGB frames decoded into memory by preload_subclip
+MAX_PRELOAD_BYTES = 512 * 1024 * 1024
+preloaded_bytes = 0
 
-print(f"\nCalculated total video duration: {total_duration:.2f}s")
+def preload_subclip(clip, size=None):
+    """Decode a short clip's frames into memory, resized to size first if given.
+
+    Returns None when the frames would not fit in the remaining preload budget.
+    """
+    global preloaded_bytes
+    if size:
+        clip = clip.resized(size)
+    clip_bytes = clip.w * clip.h * 3 * math.ceil(clip.duration * OUTPUT_FPS)
+    if preloaded_bytes + clip_bytes > MAX_PRELOAD_BYTES:
+        return None
+    preloaded_bytes += clip_bytes
+    frames = list(clip.iter_frames(fps=OUTPUT_FPS))
+    return ImageSequenceClip(frames, fps=OUTPUT_FPS).with_audio(clip.audio)
+
+# Videos used for at most this many seconds in total are buffered into memory,
+# so their ffmpeg reader can be closed right after their last use
+MAX_BUFFERED_ASSET_DURATION = 2
+video_uses = {}
+video_use_duration = {}
+for entry in config["editing"] + [overlay for overlay in config["overlays"] if overlay["type"] == "video"]:
+    if entry.get("asset") in video_assets:
+        video_uses[entry["asset"]] = video_uses.get(entry["asset"], 0) + 1
+        video_use_duration[entry["asset"]] = video_use_duration.get(entry["asset"], 0) + entry["end_time"] - entry["start_time"]
+buffered_videos = {name for name, duration in video_use_duration.items() if duration <= MAX_BUFFERED_ASSET_DURATION}
+
+def buffer_video(asset_name, clip, size=None):
+    """Preload one use of a video asset, returning clip unchanged if it doesn't fit"""
+    preloaded = preload_subclip(clip, size)
+    if preloaded is None:
+        # This use still streams from the reader, so it must stay open
+        buffered_videos.discard(asset_name)
+        return clip
+    print(f"Preloaded {clip.duration:.2f}s of '{asset_name}'")
+    return preloaded
+
+def release_video(asset_name):
+    """Drop one use of a video asset, closing its reader after the last buffered use"""
+    video_uses[asset_name] -= 1
+    if video_uses[asset_name] == 0 and asset_name in buffered_videos:
+        print(f"Closing reader for '{asset_name}', all its uses are buffered")
+        video_assets[asset_name].reader.close()
+
+# Source durations, read once instead of on every edit and overlay
+video_durations = {name: clip.duration for name, clip in video_assets.items()}
+gif_durations = {name: clip.duration for name, clip in gif_assets.items()}
+
+def fit_to_size(clip, size):
+    """Scale a clip to fit inside size, keeping its aspect, and center it on black"""
+    scale = min(size[0] / clip.w, size[1] / clip.h)
+    fitted = clip.resized(scale).with_position("center")
+    return CompositeVideoClip([fitted], size=size, bg_color=(0, 0, 0))
 
-# Process main editing
+# Process main editing, calculating total video duration to fix timing issues as we go
 main_clips = []
 current_time = 0
+total_duration = 0
 
 for edit in config["editing"]:
     # Check if 'asset' key exists
@@ -408,26 +934,40 @@ for edit in config["editing"]:
     asset_name = edit["asset"]
     if asset_name in video_assets:
         original_clip = video_assets[asset_name]
+        original_duration = video_durations[asset_name]
+        
+        requested_duration = edit["end_time"] - edit["start_time"]
+        actual_duration = min(requested_duration, original_duration - edit["start_time"])
+        if actual_duration > 0:
+            total_duration += actual_duration
         
         # Fix timing - use current_time instead of edit["start_time"]
-        start_time = min(edit["start_time"], original_clip.duration - 0.1)  # -0.1 to ensure at least 0.1s duration
-        end_time = min(edit["end_time"], original_clip.duration)
+        start_time = min(edit["start_time"], original_duration - 0.1)  # -0.1 to ensure at least 0.1s duration
+        end_time = min(edit["end_time"], original_duration)
         
         print(f"\nProcessing edit: {asset_name} from {start_time}s to {end_time}s")
-        print(f"Original clip duration: {original_clip.duration:.2f}s")
+        print(f"Original clip duration: {original_duration:.2f}s")
         
         clip = safe_subclip(original_clip, start_time, end_time)
+        if clip is not None and asset_name in buffered_videos:
+            clip = buffer_video(asset_name, clip)
+        release_video(asset_name)
         if clip is None:
             print(f"Skipping edit for {asset_name} due to invalid time range")
             continue
             
         print(f"Created subclip: {clip.duration:.2f}s")
+        # The output takes the first edit's size; letterbox any edit that differs
+        if main_clips and tuple(clip.size) != tuple(main_clips[0].size):
+            clip = fit_to_size(clip, main_clips[0].size)
         clip = apply_effects(clip, edit.get("effects", []))
         main_clips.append(clip)
         current_time += clip.duration
     else:
         print(f"Warning: Video asset '{asset_name}' not found, skipping edit")
 
+print(f"\nCalculated total video duration: {total_duration:.2f}s")
+
 # Create final video
 if main_clips:
     final_video = concatenate_videoclips(main_clips)
@@ -436,6 +976,18 @@ else:
     print("\nNo valid video clips found, creating black background")
     final_video = ColorClip((1920, 1080), color=(0, 0, 0), duration=30)
 
+# Short overlays cut from a video the edits also use are decoded into memory once,
+# so the shared reader isn't seeking back and forth between the two at render time
+MAX_PRELOAD_DURATION = 5
+edit_asset_names = {edit["asset"] for edit in config["editing"] if "asset" in edit}
+_decoded_overlays = {}
+
+def overlay_size(overlay, video_size):
+    """Pixel size an overlay's relative "size" resizes it to, or None if it has none"""
+    if "size" not in overlay:
+        return None
+    return (round(overlay["size"][0] * video_size[0]), round(overlay["size"][1] * video_size[1]))
+
 # Process overlays
 overlay_clips = []
 for overlay in config["overlays"]:
@@ -443,6 +995,7 @@ for overlay in config["overlays"]:
     
     # Create the base clip based on type
     clip = None
+    text_style = None
     
     if overlay["type"] == "video":
         # Check if 'asset' key exists
@@ -453,10 +1006,22 @@ for overlay in config["overlays"]:
         asset_name = overlay["asset"]
         if asset_name in video_assets:
             original_clip = video_assets[asset_name]
-            clip = safe_subclip(original_clip, overlay["start_time"], overlay["end_time"])
-            if clip is None:
-                print(f"Skipping video overlay due to invalid time range")
-                continue
+            size = overlay_size(overlay, final_video.size)
+            key = (asset_name, overlay["start_time"], overlay["end_time"], size)
+            if key in _decoded_overlays:
+                clip = _decoded_overlays[key].copy()
+            else:
+                clip = safe_subclip(original_clip, overlay["start_time"], overlay["end_time"])
+                if clip is None:
+                    print(f"Skipping video overlay due to invalid time range")
+                    release_video(asset_name)
+                    continue
+                if asset_name in buffered_videos or (asset_name in edit_asset_names and clip.duration <= MAX_PRELOAD_DURATION):
+                    # Buffer at the overlay's final size, not the source resolution
+                    buffered = buffer_video(asset_name, clip, size)
+                    if buffered is not clip:
+                        clip = _decoded_overlays[key] = buffered
+            release_video(asset_name)
         else:
             print(f"Warning: Video asset '{asset_name}' not found for overlay")
             continue
@@ -471,8 +1036,8 @@ for overlay in config["overlays"]:
         if asset_name in gif_assets:
             original_clip = gif_assets[asset_name]
             duration = overlay["end_time"] - overlay["start_time"]
-            if duration > original_clip.duration:
-                print(f"Looping GIF from {original_clip.duration:.2f}s to {duration:.2f}s")
+            if duration > gif_durations[asset_name]:
+                print(f"Looping GIF from {gif_durations[asset_name]:.2f}s to {duration:.2f}s")
                 clip = loop_clip(original_clip, duration)
             else:
                 clip = safe_subclip(original_clip, 0, duration)
@@ -514,15 +1079,16 @@ for overlay in config["overlays"]:
                 font_size=overlay["font_size"],
                 color=color_rgb  # Use RGB tuple instead of string
             ).with_duration(duration)
+            text_style = (overlay["text"], font_path, overlay["font_size"])
             
             # Add background if specified
             if "background" in overlay:
                 bg_color = color_string_to_rgb(overlay["background"]["color"])
-                bg = ColorClip(
-                    clip.size,
-                    color=bg_color,
-                    duration=clip.duration
-                ).with_opacity(overlay["background"]["opacity"])
+                bg = make_background(
+                    tuple(clip.size),
+                    bg_color,
+                    overlay["background"]["opacity"]
+                ).with_duration(clip.duration)
                 clip = CompositeVideoClip([bg, clip])
         except Exception as e:
             print(f"Error creating text clip: {str(e)}")
@@ -532,13 +1098,14 @@ for overlay in config["overlays"]:
         print(f"Warning: Could not create {overlay['type']} overlay")
         continue
     
-    # Apply size
-    if "size" in overlay:
-        clip = clip.resized((overlay["size"][0] * final_video.w, overlay["size"][1] * final_video.h))
-
-    # Apply position
-    position = parse_position(overlay["position"], final_video.size)
-    clip = clip.with_position(position)
+    # Apply size first, so effects below work at the final resolution
+    # (preloaded overlays were buffered at their final size already)
+    scale = (1.0, 1.0)
+    size = overlay_size(overlay, final_video.size)
+    if size and tuple(clip.size) != size:
+        original_w, original_h = clip.size
+        clip = clip.resized(size)
+        scale = (clip.w / original_w, clip.h / original_h)
 
     # Apply opacity
     if "opacity" in overlay:
@@ -546,11 +1113,15 @@ for overlay in config["overlays"]:
 
     # Apply effects
     if "effects" in overlay:
-        clip = apply_effects(clip, overlay["effects"])
+        clip = apply_effects(clip, overlay["effects"], scale, text_style)
+
+    # Apply position after effects, since composite effects return an unpositioned clip
+    position = parse_position(overlay["position"], final_video.size)
+    clip = clip.with_position(position)
 
     # Apply animation - FIXED: Pass video_size parameter
     if "animation" in overlay:
-        clip = apply_animation(clip, overlay["animation"], final_video.size)
+        clip = apply_animation(clip, overlay["animation"], final_video.size, position, text_style, scale)
 
     # Set start time
     clip = clip.with_start(overlay["start_time"])
@@ -563,7 +1134,8 @@ if overlay_clips:
     print(f"\nFinal video with overlays duration: {final_video.duration:.2f}s")
 
 # Process audio
-final_audio = None
+# Collect every track and mix them in a single composite rather than chaining pairwise overlays
+audio_parts = []
 for audio in config["audio"]:
     # Check if 'asset' key exists
     if "asset" not in audio:
@@ -584,22 +1156,41 @@ for audio in config["audio"]:
         volume = audio.get("volume", 1.0)
         audio_clip = audio_clip * volume
         
-        if final_audio is None:
-            final_audio = audio_clip
-        else:
-            final_audio = final_audio.overlay(audio_clip)
+        audio_parts.append(audio_clip)
         print(f"Added audio: '{asset_name}' from {audio['start_time']}s to {end_time}s with volume {volume}")
     else:
         print(f"Warning: Audio asset '{asset_name}' not found, skipping")
 
-if final_audio:
-    final_video = final_video.with_audio(final_audio)
+if audio_parts:
+    final_video = final_video.with_audio(CompositeAudioClip(audio_parts))
 
 # Write output
-output_path = os.path.join(script_dir, "output_overlays.mp4")
 print(f"\nRendering video to: {output_path}")
 print(f"Final video duration: {final_video.duration:.2f}s")
-final_video.write_videofile(output_path, fps=24, codec="libx264", audio_codec="aac")
+rendered = False
+if nvenc_available(FFMPEG_BINARY):
+    try:
+        final_video.write_videofile(
+            output_path,
+            fps=OUTPUT_FPS,
+            codec="h264_nvenc",
+            preset=NVENC_PRESET,
+            ffmpeg_params=NVENC_PARAMS,
+            audio_codec="aac"
+        )
+        rendered = True
+    except Exception as e:
+        print(f"NVENC encoding failed, falling back to libx264: {str(e)}")
+if not rendered:
+    final_video.write_videofile(
+        output_path,
+        fps=OUTPUT_FPS,
+        codec="libx264",
+        preset=X264_PRESET,
+        threads=os.cpu_count(),
+        ffmpeg_params=X264_PARAMS,
+        audio_codec="aac"
+    )
 
 # Clean up
 print("\nCleaning up resources...")